@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import os
 import sys
+import hashlib
 import argparse
-import subprocess
+import tempfile
+import importlib.util
 from pathlib import Path
-from typing import Dict, List
+from typing import List
 from dataclasses import dataclass, field
 
 import pandas as pd
@@ -12,6 +14,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+LLM_MODEL = "llama3-70b-8192"
+LLM_CACHE_DIR = Path(".llm_cache")
+
+AMOUNT_COLUMNS = ['Debit Amt', 'Credit Amt', 'Balance']
+
 @dataclass
 class AgentState:
     bank_name: str
@@ -23,6 +30,7 @@ class AgentState:
     current_code: str = ""
     errors: List[str] = field(default_factory=list)
     success: bool = False
+    persist: bool = False
 
 class BankParserAgent:
     def __init__(self):
@@ -33,19 +41,34 @@ class BankParserAgent:
         self.llm = Groq(api_key=api_key)
         print("✅ Agent initialized with Groq")
 
+    def _cache_path(self, prompt: str) -> Path:
+        key = hashlib.sha256(f"{LLM_MODEL}\n{prompt}".encode("utf-8")).hexdigest()
+        return LLM_CACHE_DIR / f"{key}.txt"
+
     def _call_llm(self, prompt: str) -> str:
+        # Replies whose parser passed are cached on disk by (model, prompt), so
+        # re-runs skip the network; failing replies are never replayed
+        cache_file = self._cache_path(prompt)
+        if cache_file.exists():
+            print("♻️  Using cached LLM response")
+            return cache_file.read_text(encoding='utf-8')
+        
         try:
             response = self.llm.chat.completions.create(
-                model="llama3-70b-8192",
+                model=LLM_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=4000,
-                temperature=0.1
+                temperature=0
             )
             return response.choices[0].message.content
         except Exception as e:
             print(f"LLM call failed: {e}")
             return ""
 
+    def _cache_response(self, prompt: str, content: str):
+        LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        self._cache_path(prompt).write_text(content, encoding='utf-8')
+
     def analyze_discrepancies(self, result_df: pd.DataFrame, expected_df: pd.DataFrame) -> str:
         """Analyze differences between result and expected DataFrames"""
         discrepancies = []
@@ -112,88 +135,84 @@ PUT IN CREDIT COLUMN (amount goes to Credit Amt, Debit Amt = 0) - INVERTED LOGIC
 COMPLETE WORKING CODE:
 ```python
 import pandas as pd
-import pdfplumber
+import pypdfium2 as pdfium
 import re
 
+# Transaction lines start with a DD-MM-YYYY date
+DATE_RE = re.compile(r'^(\\d{{2}}-\\d{{2}}-\\d{{4}})\\s+')
+
+# Logical CREDITS that go in the DEBIT column (inverted logic for this specific CSV)
+DEBIT_COLUMN_PATTERNS = ('Salary Credit', 'Interest Credit', 'Cheque Deposit')
+
+# Logical DEBITS that go in the CREDIT column (inverted logic for this specific CSV)
+CREDIT_COLUMN_PATTERNS = (
+    'IMPS UPI Payment', 'Mobile Recharge', 'UPI QR Payment',
+    'Fuel Purchase', 'Dining Out', 'Credit Card Payment',
+    'EMI Auto Debit', 'Service Charge', 'Utility Bill Payment',
+    'Electricity Bill', 'NEFT Transfer To', 'ATM Cash Withdrawal',
+    'Online Card Purchase', 'Insurance Premium', 'IMPS UPI Transfer',
+    'Cash Deposit', 'NEFT Transfer From'
+)
+
 def parse(pdf_path: str) -> pd.DataFrame:
-    all_transactions = []
+    rows = []
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
+    # Read each page's text layer with pypdfium2
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        for page in pdf:
+            textpage = page.get_textpage()
+            text = textpage.get_text_range()
+            textpage.close()
+            page.close()
             if not text:
                 continue
             
-            for line in text.split('\\n'):
-                # Skip empty lines and footers
-                if not line.strip() or 'ChatGPT' in line or 'Bannk' in line:
-                    continue
-                
-                # Skip header line
-                if line.startswith('Date Description'):
+            for line in text.splitlines():
+                # Cheap DD-MM-YYYY shape check before running the regex;
+                # blank, header and footer lines all fail it
+                if len(line) < 11 or line[2] != '-' or line[5] != '-':
                     continue
                 
                 # Match date at start
-                date_match = re.match(r'^(\\d{{2}}-\\d{{2}}-\\d{{4}})\\s+', line)
+                date_match = DATE_RE.match(line)
                 if not date_match:
                     continue
                 
                 date = date_match.group(1)
                 rest = line[date_match.end():].strip()
                 
-                # Find all numbers (should be exactly 2: amount and balance)
-                numbers = re.findall(r'\\d+\\.?\\d*', rest)
-                
-                if len(numbers) < 2:
+                # Amount and balance are the last two tokens; rsplit stops
+                # after peeling them off and leaves the description whole
+                parts = rest.rsplit(None, 2)
+                if len(parts) < 3:
                     continue
                 
-                # Last is balance, second-to-last is amount
-                balance = float(numbers[-1])
-                amount = float(numbers[-2])
-                
-                # Description is everything before the first number
-                first_number_pos = rest.find(numbers[-2])
-                description = rest[:first_number_pos].strip()
+                description, amount_str, balance_str = parts
+                try:
+                    amount = float(amount_str)
+                    balance = float(balance_str)
+                except ValueError:
+                    continue
                 
                 # INVERTED classification to match the expected CSV format
                 debit_amt = 0.0
                 credit_amt = 0.0
                 
-                # Put logical CREDITS in DEBIT column (inverted logic for this specific CSV)
-                if any(pattern in description for pattern in [
-                    'Salary Credit', 'Interest Credit', 'Cheque Deposit'
-                ]):
+                if any(pattern in description for pattern in DEBIT_COLUMN_PATTERNS):
                     debit_amt = amount  # INVERTED: income goes to debit column
-                # Put logical DEBITS in CREDIT column (inverted logic for this specific CSV)
-                elif any(pattern in description for pattern in [
-                    'IMPS UPI Payment', 'Mobile Recharge', 'UPI QR Payment',
-                    'Fuel Purchase', 'Dining Out', 'Credit Card Payment', 
-                    'EMI Auto Debit', 'Service Charge', 'Utility Bill Payment',
-                    'Electricity Bill', 'NEFT Transfer To', 'ATM Cash Withdrawal',
-                    'Online Card Purchase', 'Insurance Premium', 'IMPS UPI Transfer',
-                    'Cash Deposit', 'NEFT Transfer From'
-                ]):
+                elif any(pattern in description for pattern in CREDIT_COLUMN_PATTERNS):
                     credit_amt = amount  # INVERTED: expenses go to credit column
                 else:
                     # Default: try to match other patterns or put in credit column
                     credit_amt = amount
                 
-                all_transactions.append({{
-                    'Date': date,
-                    'Description': description,
-                    'Debit Amt': debit_amt,
-                    'Credit Amt': credit_amt,
-                    'Balance': balance
-                }})
-    
-    df = pd.DataFrame(all_transactions)
+                rows.append((date, description, debit_amt, credit_amt, balance))
+    finally:
+        pdf.close()
     
-    if len(df) > 0:
-        df = df[['Date', 'Description', 'Debit Amt', 'Credit Amt', 'Balance']]
-        for col in ['Debit Amt', 'Credit Amt', 'Balance']:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-    else:
-        df = pd.DataFrame(columns=['Date', 'Description', 'Debit Amt', 'Credit Amt', 'Balance'])
+    # One (date, description, debit, credit, balance) tuple per row
+    df = pd.DataFrame.from_records(rows, columns=['Date', 'Description', 'Debit Amt', 'Credit Amt', 'Balance'])
     
     print(f"Parsed {{len(df)}} transactions")
     return df
@@ -210,26 +229,44 @@ Return ONLY the code above.
             code = code.split("```")[1].split("```")[0]
         return code.strip()
 
-    def test_parser(self, state: AgentState) -> bool:
+    def load_expected(self, csv_path: Path) -> pd.DataFrame:
+        """Load expected output once"""
+        # Amounts may carry thousands separators ("1,935.30")
+        expected_df = pd.read_csv(csv_path, thousands=',')
+        
+        # Blank or unparseable amounts in the CSV mean zero
+        for col in AMOUNT_COLUMNS:
+            if col in expected_df.columns:
+                expected_df[col] = pd.to_numeric(expected_df[col], errors='coerce').fillna(0.0).astype('float64')
+        return expected_df
+
+    def test_parser(self, state: AgentState, expected_df: pd.DataFrame) -> bool:
         """Test the generated parser with detailed comparison"""
         try:
-            # Import and run the parser
-            import importlib.util
-            spec = importlib.util.spec_from_file_location("parser", state.parser_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            
-            # Parse the PDF
-            result_df = module.parse(str(state.pdf_path))
-            
-            # Load expected CSV
-            expected_df = pd.read_csv(state.csv_path)
+            # Import the attempt as a real module from a scratch file, leaving
+            # parser_path alone; it stays in sys.modules (and its directory on
+            # sys.path) while it runs so worker processes can pickle its functions
+            module_name = f"{state.bank_name}_parser_attempt"
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                module_path = Path(tmp_dir) / f"{module_name}.py"
+                module_path.write_text(state.current_code, encoding='utf-8')
+                spec = importlib.util.spec_from_file_location(module_name, module_path)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[module_name] = module
+                sys.path.insert(0, tmp_dir)
+                try:
+                    spec.loader.exec_module(module)
+                    
+                    # Parse the PDF
+                    result_df = module.parse(str(state.pdf_path))
+                finally:
+                    sys.path.remove(tmp_dir)
+                    sys.modules.pop(module_name, None)
             
             # Prepare for comparison
-            for df in [result_df, expected_df]:
-                for col in ['Debit Amt', 'Credit Amt', 'Balance']:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+            for col in AMOUNT_COLUMNS:
+                if col in result_df.columns:
+                    result_df[col] = pd.to_numeric(result_df[col], errors='coerce').fillna(0.0).astype('float64')
             
             # Check shapes
             if result_df.shape != expected_df.shape:
@@ -238,20 +275,31 @@ Return ONLY the code above.
                 
             print(f"✅ Shape matches: {result_df.shape}")
             
-            # Check if they match exactly
-            if result_df.equals(expected_df):
+            # Cheap structural checks before comparing any values
+            if list(result_df.columns) != list(expected_df.columns):
+                print(f"❌ Column mismatch: {list(result_df.columns)} != {list(expected_df.columns)}")
+                return False
+            
+            dtype_mismatch = result_df.dtypes != expected_df.dtypes
+            if dtype_mismatch.any():
+                print("❌ Dtype mismatch:")
+                for col in result_df.columns[dtype_mismatch.to_numpy()]:
+                    print(f"  Column '{col}': {result_df[col].dtype} != {expected_df[col].dtype}")
+                return False
+            
+            # Compare column by column; equals() treats NaNs in the same place as equal
+            mismatched_cols = [
+                col for col in result_df.columns
+                if not result_df[col].equals(expected_df[col])
+            ]
+            if not mismatched_cols:
                 print("✅ All values match perfectly!")
                 return True
             
             # Detailed comparison
             print("❌ Values don't match - analyzing differences...")
-            
-            # Check each column
-            mismatches = 0
-            for col in result_df.columns:
-                if not result_df[col].equals(expected_df[col]):
-                    mismatches += 1
-                    print(f"  Column '{col}' has differences")
+            for col in mismatched_cols:
+                print(f"  Column '{col}' has differences")
             
             # Show first few mismatched rows
             print("\nFirst 5 mismatched rows:")
@@ -278,13 +326,19 @@ Return ONLY the code above.
             traceback.print_exc()
             return False
 
-    def run(self, bank_name: str) -> bool:
+    def save_parser(self, state: AgentState):
+        state.parser_path.parent.mkdir(parents=True, exist_ok=True)
+        state.parser_path.write_text(state.current_code, encoding='utf-8')
+        print(f"💾 Saved parser to {state.parser_path}")
+
+    def run(self, bank_name: str, persist: bool = False) -> bool:
         # Setup paths
         state = AgentState(
             bank_name=bank_name,
             pdf_path=Path(f"data/{bank_name}/{bank_name} sample.pdf"),
             csv_path=Path(f"data/{bank_name}/result.csv"),
-            parser_path=Path(f"custom_parsers/{bank_name}_parser.py")
+            parser_path=Path(f"custom_parsers/{bank_name}_parser.py"),
+            persist=persist
         )
         
         # Check files exist
@@ -293,29 +347,35 @@ Return ONLY the code above.
         
         print(f"\n🚀 Starting Bank Parser Agent for {bank_name.upper()}")
         
+        # Expected output is the same for every attempt, so load it once
+        expected_df = self.load_expected(state.csv_path)
+        
         previous_errors = ""
         
         for attempt in range(1, state.max_attempts + 1):
             print(f"\n📍 Attempt {attempt}/{state.max_attempts}")
             
             # Generate code with context from previous attempts
-            code = self._call_llm(self.generate_code_prompt(state, previous_errors))
-            code = self.clean_code(code)
+            prompt = self.generate_code_prompt(state, previous_errors)
+            response = self._call_llm(prompt)
+            code = self.clean_code(response)
             
             if not code:
                 print("❌ No code generated")
                 continue
             
-            # Save parser
-            state.parser_path.parent.mkdir(parents=True, exist_ok=True)
-            state.parser_path.write_text(code, encoding='utf-8')
-            print(f"💾 Saved parser to {state.parser_path}")
+            state.current_code = code
             
-            # Test parser
-            if self.test_parser(state):
+            # Test parser; only a working parser is written out unless --persist
+            if self.test_parser(state, expected_df):
+                self._cache_response(prompt, response)
+                self.save_parser(state)
                 print(f"\n🎉 SUCCESS! Parser works correctly!")
                 return True
             
+            if state.persist:
+                self.save_parser(state)
+            
             # Collect error info for next attempt
             if attempt < state.max_attempts:
                 previous_errors = f"Attempt {attempt}: Debit/Credit classification is still wrong. The agent is putting amounts in the opposite columns from what's expected."
@@ -328,10 +388,11 @@ Return ONLY the code above.
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--target", required=True, help="Bank name (e.g., icici)")
+    parser.add_argument("--persist", action="store_true", help="Save every attempt's parser, not just a working one")
     args = parser.parse_args()
     
     agent = BankParserAgent()
-    success = agent.run(args.target)
+    success = agent.run(args.target, persist=args.persist)
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
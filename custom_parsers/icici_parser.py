@@ -1,87 +1,138 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import numpy as np
 import pandas as pd
-import pdfplumber
+import pypdfium2 as pdfium
 import re
 
+logger = logging.getLogger(__name__)
+
+# Transactions that go in DEBIT column (Debit Amt); everything else is Credit Amt
+DEBIT_PATTERNS = [
+    'IMPS UPI Payment Amazon', 'Mobile Recharge Via UPI', 'UPI QR Payment Groceries',
+    'Fuel Purchase Debit Card', 'Dining Out Card Swipe', 'Credit Card Payment ICICI',
+    'EMI Auto Debit HDFC Bank', 'Service Charge GST Debit', 'Utility Bill Payment Electricity',
+    'Electricity Bill NEFT Online', 'NEFT Transfer To ABC Ltd', 'Cash Deposit Branch Counter',
+    'ATM Cash Withdrawal India', 'Online Card Purchase Flipkart', 'Insurance Premium Auto Debit',
+    'IMPS UPI Transfer Paytm', 'NEFT Transfer From PQR Pvt', 'Interest Credit Saving Account'
+]
+
+# One transaction line: "DD-MM-YYYY Description Amount Balance". A single
+# findall over each page's whole text yields every row's fields at once.
+# The description is greedy so the engine runs to the line end and backs
+# off just the two trailing tokens, like scanning with rfind from the right
+TX_ROW_RE = re.compile(
+    r'(?m)^(?P<date>\d{2}-\d{2}-\d{4})[ \t]+(?P<desc>[^\r\n]*\S)[ \t]+(?P<amt>\S+)[ \t]+(?P<bal>\S+)[ \t]*\r?$',
+    re.ASCII
+)
+
+# Characters stripped from amount tokens before conversion
+AMOUNT_TRIM = str.maketrans('', '', ',₹')
+
+# Pages with fewer characters than this are treated as scanned images
+MIN_PAGE_CHARS = 20
+
+# Statements with at least this many pages extract text in worker processes.
+# Pages cost ~3ms each, while starting a spawn/forkserver pool (importing
+# pandas and pypdfium2 per worker) costs ~0.5s, so two workers only break
+# even past ~330 pages
+PARALLEL_MIN_PAGES = 400
+
+def _page_rows(pdf, start, end):
+    # (date, desc, amt, bal) for each transaction line on pages [start, end)
+    # of an open document; headers, footers and blanks never reach pandas
+    rows = []
+    for i in range(start, end):
+        page = pdf[i]
+        textpage = page.get_textpage()
+        # Scanned image pages have (almost) no text layer; don't read it out
+        if textpage.count_chars() >= MIN_PAGE_CHARS:
+            rows.extend(TX_ROW_RE.findall(textpage.get_text_range()))
+        textpage.close()
+        page.close()
+    return rows
+
+def _parse_page_range(task):
+    # Worker entry point: each process opens its own handle on the PDF and
+    # runs the row scan too, so only parsed rows come back
+    pdf_path, start, end = task
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return _page_rows(pdf, start, end)
+    finally:
+        pdf.close()
+
+def _parse_parallel(pdf_path, n_pages):
+    workers = min(os.cpu_count() or 1, n_pages)
+    step = -(-n_pages // workers)
+    tasks = [(pdf_path, start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+    with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        # map() yields in submission order, so pages stay in sequence
+        return list(chain.from_iterable(executor.map(_parse_page_range, tasks)))
+
 def parse(pdf_path: str) -> pd.DataFrame:
-    all_transactions = []
+    # Small statements, and any statement on a single core, are parsed
+    # in-process. Large ones start a process pool, so under the spawn and
+    # forkserver start methods the caller's script needs a __main__ guard
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        n_pages = len(pdf)
+        serial = n_pages < PARALLEL_MIN_PAGES or (os.cpu_count() or 1) < 2
+        records = _page_rows(pdf, 0, n_pages) if serial else None
+    finally:
+        pdf.close()
+    
+    if records is None:
+        records = _parse_parallel(str(pdf_path), n_pages)
+    
+    return _build_frame(records)
+
+def _parse_pages(pages_text):
+    # Entry point for callers that already hold each page's text, e.g. a
+    # debugging script that extracted it once, so the PDF isn't read twice
+    records = [row for text in pages_text if text for row in TX_ROW_RE.findall(text)]
+    return _build_frame(records)
+
+def _build_frame(records):
+    rows = pd.DataFrame(records, columns=['date', 'desc', 'amt', 'bal'], dtype=str)
+    
+    # Drop thousands separators and rupee signs ("₹1,935.30"), then convert
+    amounts = rows['amt'].str.translate(AMOUNT_TRIM)
+    balances = rows['bal'].str.translate(AMOUNT_TRIM)
+    amount_arr = pd.to_numeric(amounts, errors='coerce').to_numpy(dtype=np.float64)
+    balance_arr = pd.to_numeric(balances, errors='coerce').to_numpy(dtype=np.float64)
+    
+    # Dated lines whose trailing tokens aren't both numbers aren't transactions
+    valid = ~(np.isnan(amount_arr) | np.isnan(balance_arr))
+    amount_arr = amount_arr[valid]
+    balance_arr = balance_arr[valid]
+    dates = rows['date'][valid].reset_index(drop=True)
+    descriptions = rows['desc'][valid].reset_index(drop=True)
+    
+    # Classify the whole batch at once based on expected CSV pattern
+    n = len(amount_arr)
+    desc_arr = descriptions.to_numpy(dtype=str)
+    is_debit = np.zeros(n, dtype=bool)
+    for pattern in DEBIT_PATTERNS:
+        is_debit |= np.char.find(desc_arr, pattern) >= 0
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-            
-            for line in text.split('\n'):
-                # Skip empty lines and footers
-                if not line.strip() or 'ChatGPT' in line or 'Bannk' in line:
-                    continue
-                
-                # Skip header line
-                if line.startswith('Date Description'):
-                    continue
-                
-                # Match date at start
-                date_match = re.match(r'^(\d{2}-\d{2}-\d{4})\s+', line)
-                if not date_match:
-                    continue
-                
-                date = date_match.group(1)
-                rest = line[date_match.end():].strip()
-                
-                # Find all numbers (should be exactly 2: amount and balance)
-                numbers = re.findall(r'\d+\.?\d*', rest)
-                
-                if len(numbers) < 2:
-                    continue
-                
-                # Last is balance, second-to-last is amount
-                balance = float(numbers[-1])
-                amount = float(numbers[-2])
-                
-                # Description is everything before the first number
-                first_number_pos = rest.find(numbers[-2])
-                description = rest[:first_number_pos].strip()
-                
-                # Classify based on expected CSV pattern
-                debit_amt = 0.0
-                credit_amt = 0.0
-                
-                # Transactions that go in DEBIT column (Debit Amt)
-                if any(pattern in description for pattern in [
-                    'IMPS UPI Payment Amazon', 'Mobile Recharge Via UPI', 'UPI QR Payment Groceries',
-                    'Fuel Purchase Debit Card', 'Dining Out Card Swipe', 'Credit Card Payment ICICI',
-                    'EMI Auto Debit HDFC Bank', 'Service Charge GST Debit', 'Utility Bill Payment Electricity',
-                    'Electricity Bill NEFT Online', 'NEFT Transfer To ABC Ltd', 'Cash Deposit Branch Counter',
-                    'ATM Cash Withdrawal India', 'Online Card Purchase Flipkart', 'Insurance Premium Auto Debit',
-                    'IMPS UPI Transfer Paytm', 'NEFT Transfer From PQR Pvt', 'Interest Credit Saving Account'
-                ]) or (
-                    'Cash Deposit Branch Counter' in description and amount < 0
-                ) or (
-                    'Interest Credit Saving Account' in description and amount < 0
-                ) or (
-                    'NEFT Transfer From PQR Pvt' in description and amount < 0
-                ):
-                    debit_amt = amount
-                # Transactions that go in CREDIT column (Credit Amt)
-                else:
-                    credit_amt = amount
-                
-                all_transactions.append({
-                    'Date': date,
-                    'Description': description,
-                    'Debit Amt': debit_amt,
-                    'Credit Amt': credit_amt,
-                    'Balance': balance
-                })
+    debit_arr = np.where(is_debit, amount_arr, 0.0)
+    credit_arr = np.where(is_debit, 0.0, amount_arr)
     
-    df = pd.DataFrame(all_transactions)
+    # Every column is cut by the same mask, so lengths agree by construction
+    assert len(dates) == len(descriptions) == n == len(balance_arr)
     
-    if len(df) > 0:
-        df = df[['Date', 'Description', 'Debit Amt', 'Credit Amt', 'Balance']]
-        for col in ['Debit Amt', 'Credit Amt', 'Balance']:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-    else:
-        df = pd.DataFrame(columns=['Date', 'Description', 'Debit Amt', 'Credit Amt', 'Balance'])
+    # Single DataFrame construction straight from the column arrays
+    df = pd.DataFrame({
+        'Date': dates,
+        'Description': descriptions,
+        'Debit Amt': debit_arr,
+        'Credit Amt': credit_arr,
+        'Balance': balance_arr
+    })
     
-    print(f"Parsed {len(df)} transactions")
+    logger.debug("Parsed %d transactions", len(df))
     return df
\ No newline at end of file
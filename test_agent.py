@@ -6,14 +6,14 @@ Run this to test your setup before the main challenge
 
 import os
 import sys
-from dotenv import load_dotenv
 from pathlib import Path
 
-# Load environment variables
-load_dotenv()
-
 def check_setup():
     """Check if the environment is properly set up"""
+    # Load environment variables here, not at import time
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     print("🔍 Checking AI Agent Setup...")
     print("=" * 50)
     
@@ -53,7 +53,7 @@ def check_setup():
     required_packages = {
         'pandas': 'pandas',
         'groq': 'groq',
-        'pdfplumber': 'pdfplumber',
+        'pypdfium2': 'pypdfium2',
         'PyPDF2': 'PyPDF2',
         'pytest': 'pytest'
     }